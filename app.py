@@ -1,24 +1,59 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import json, re, aiohttp, asyncio, string
-from flask import Flask, request, jsonify, Response
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from resources.dutch_lexicon import dutch_lexicon
-from src.models import AppStoreEntry, Review
-from src.sentiments import Sentiments
+import os, json, re, time, atexit, itertools, contextlib, tempfile
+from flask import Flask, request, jsonify, Response, g, has_request_context
+from src.models import AppStoreEntry, Review, ReviewRecord
+from src.sentiments import Sentiments, BatchScorer
 from src.errors import InvalidUsage
-from collections import Counter
-import nltk
+from src.fetcher import AppStoreFetcher
+from src.cache import LRUCache, SentimentCache
+from src.statistics import Statistics
+from src.artifacts import loadArtifacts, DEFAULT_PATH
+from src.documents import iterDocuments, LimitedBody
+from src.store import ReviewStore
+from src.metrics import Registry, Counter, Gauge, Histogram, SamplingProfiler
 
 # ==============================================================================
 # Properties definitions
 # ==============================================================================
 
 app = Flask(__name__)
-analyzer = SentimentIntensityAnalyzer()
-analyzer.lexicon.update(dutch_lexicon)
-nltk.download('stopwords')
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('BATCH_MAX_BYTES', 64 * 1024 * 1024))
+artifacts = loadArtifacts(os.environ.get('ARTIFACTS_PATH', DEFAULT_PATH))
+analyzer = Sentiments.analyzer(artifacts.lexicon)
+metrics = Registry(os.environ.get('METRICS_DIR'))
+atexit.register(metrics.dump)
+requestSeconds = metrics.register(Histogram('sentiment_api_request_seconds', 'Latency of handled requests', ('route', 'status')))
+stageSeconds = metrics.register(Histogram('sentiment_api_stage_seconds', 'Time spent in each stage of request handling', ('stage',)))
+appStoreSeconds = metrics.register(Histogram('appstore_request_seconds', 'Latency of AppStore feed page requests', ('outcome',)))
+failedPagesTotal = metrics.register(Counter('appstore_failed_pages_total', 'Feed pages left out of a response after all retries'))
+profilingEnabled = os.environ.get('PROFILING_ENABLED') in ('1', 'true')
+profileDirectory = os.environ.get('PROFILE_DIR', tempfile.gettempdir())
+fetcher = AppStoreFetcher(
+    maxConcurrency=int(os.environ.get('APPSTORE_MAX_CONCURRENCY', 20)),
+    pageTimeout=float(os.environ.get('APPSTORE_PAGE_TIMEOUT', 5)),
+    retries=int(os.environ.get('APPSTORE_RETRIES', 2)),
+    cache=LRUCache(
+        maxSize=int(os.environ.get('APPSTORE_CACHE_BYTES', 32 * 1024 * 1024)),
+        ttl=float(os.environ.get('APPSTORE_CACHE_TTL', 60))),
+    onRequest=appStoreSeconds.observe,
+    url=os.environ.get('APPSTORE_URL'))
+atexit.register(fetcher.close)
+sentimentCache = SentimentCache(
+    artifacts.version,
+    maxItems=int(os.environ.get('SENTIMENT_CACHE_SIZE', 100000)),
+    path=os.environ.get('SENTIMENT_CACHE_PATH'),
+    maxRows=int(os.environ.get('SENTIMENT_CACHE_ROWS', 1000000)))
+strictValidation = os.environ.get('STRICT_VALIDATION') in ('1', 'true')
+scorer = BatchScorer(analyzer, processes=int(os.environ.get('SCORING_PROCESSES', 0)))
+atexit.register(scorer.close)
+reviewStore = ReviewStore(os.environ['REVIEW_STORE_PATH'], artifacts.version) if os.environ.get('REVIEW_STORE_PATH') else None
+batchSize = int(os.environ.get('BATCH_SIZE', 500))
+batchMaxDocuments = int(os.environ.get('BATCH_MAX_DOCUMENTS', 100000))
+batchMaxTextLength = int(os.environ.get('BATCH_MAX_TEXT_LENGTH', 10000))
+metrics.register(Gauge('appstore_page_cache', 'AppStore page cache counters', fetcher.stats, 'counter'))
+metrics.register(Gauge('sentiment_cache', 'Sentiment cache counters', sentimentCache.stats, 'counter'))
 
 # ==============================================================================
 # Routes
@@ -28,6 +63,18 @@ nltk.download('stopwords')
 def appleReviews():
     return handleAppleReviews()
 
+@app.route("/sentiment/batch", methods=['POST'])
+def sentimentBatch():
+    return handleSentimentBatch()
+
+@app.route("/apple/cache", methods=['GET'])
+def appleCache():
+    return jsonify(pages=fetcher.stats(), sentiments=sentimentCache.stats())
+
+@app.route("/metrics", methods=['GET'])
+def prometheusMetrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ==============================================================================
 # Route handling
 # ==============================================================================
@@ -37,37 +84,168 @@ def handleAppleReviews():
     appID = request.args.get('appID')
     pages = request.args.get('pages')
     pages = 1 if pages is None else int(pages)
-    stats = None
 
     validateAppStoreParameters(country, appID, pages)
 
+    if reviewStore is not None:
+        return handleStoredAppleReviews(country, appID, pages)
+
+    if request.args.get('stream') in ('1', 'true') or request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return handleAppleReviewsStream(country, appID, pages)
+
     try:
-        rawEntries = asyncio.run(get_appstore_reviews(country, appID, pages))
-        entries = AppStoreEntry(many=True).load(rawEntries)
+        with timed('fetch'):
+            result = fetcher.fetch(country, appID, pages)
+        with timed('decode'):
+            entries = decodeEntries(result.entries)
     except Exception as error:
         app.logger.error(f'Network error => {error}')
         raise InvalidUsage('Something went wrong while trying to fetch data from the AppStore', status_code=500)
+
+    if len(result.failedPages) == pages:
+        failedPagesTotal.inc(pages)
+        app.logger.error(f'Network error => all {pages} pages failed')
+        raise InvalidUsage('Something went wrong while trying to fetch data from the AppStore', status_code=500)
+
+    if result.failedPages:
+        app.logger.warning(f'Network error => pages {result.failedPages} failed')
+        failedPagesTotal.inc(len(result.failedPages))
     
-    for entry in entries:
-        title = entry['title']
-        review = entry['review']
-        documents = title + '. ' + review
-        sentiments = Sentiments.analyse(documents, analyzer)
-        compoundSentiment = sentiments['compound']
-        entry['sentiment'] = compoundSentiment
+    with timed('score'):
+        scoreEntries(entries)
+
+    return reviewsResponse(entries, country, result.failedPages)
 
-    reviews = Review(many=True).dump(entries)
-    jsonResponse = {"reviews" : reviews}
+def handleStoredAppleReviews(country, appID, pages):
+    version = request.args.get('version')
+    since = request.args.get('since')
+    limit = request.args.get('limit')
+    limit = pages * 50 if limit is None else int(limit)
+
+    validateStoreParameters(limit)
 
     try:
-        stopwords = localStopwords(country)
-        jsonResponse['statistics'] = calculateStatistics(entries, stopwords)
+        # The stored history must cover the requested pages, and the limit when it reaches further.
+        with timed('fetch'):
+            synced = reviewStore.sync(country, appID, lambda page: fetcher.fetchPage(country, appID, page), max(pages, -(-limit // 50)))
+        with timed('decode'):
+            entries = reviewStore.reviews(country, appID, limit=limit, version=version, since=since)
+
+        unscored = [entry for entry in entries if entry.sentiment is None]
+        if unscored:
+            with timed('score'):
+                scoreEntries(unscored)
+                reviewStore.updateSentiments(country, appID, unscored)
     except Exception as error:
-        app.logger.warning(f'Statistics error => {error}')
-        pass
+        app.logger.error(f'Review store error => {error}')
+        raise InvalidUsage('Something went wrong while trying to fetch data from the AppStore', status_code=500)
 
-    response = Response(json.dumps(jsonResponse))
-    response.headers['Content-Type'] = 'application/json'
+    if synced.failedPages:
+        app.logger.warning(f'Network error => sync of {country}/{appID} stopped at page {synced.failedPages[0]}, serving stored reviews')
+        failedPagesTotal.inc(len(synced.failedPages))
+
+    if synced.failedPages and not entries:
+        raise InvalidUsage('Something went wrong while trying to fetch data from the AppStore', status_code=500)
+
+    return reviewsResponse(entries, country, synced.failedPages)
+
+def handleAppleReviewsStream(country, appID, pages):
+    # Wait for the first successful page, so a complete failure is still reported with a 500.
+    pageResults = fetcher.iterPages(country, appID, pages)
+    failedPages = []
+
+    with timed('fetch'):
+        for page, rawEntries in pageResults:
+            if rawEntries is not None:
+                firstPage = (page, rawEntries)
+                break
+            failedPages.append(page)
+        else:
+            failedPagesTotal.inc(pages)
+            app.logger.error(f'Network error => all {pages} pages failed')
+            raise InvalidUsage('Something went wrong while trying to fetch data from the AppStore', status_code=500)
+
+    # Stages of the streamed pages only end up in the histograms, the headers are gone by then.
+    def generate():
+        statistics = Statistics()
+
+        for page, rawEntries in itertools.chain([firstPage], pageResults):
+            try:
+                with timed('decode'):
+                    pageEntries = decodeEntries(rawEntries) if rawEntries is not None else None
+            except Exception as error:
+                app.logger.error(f'Decoding error => {error}')
+                pageEntries = None
+
+            if pageEntries is None:
+                failedPages.append(page)
+                continue
+
+            with timed('score'):
+                scoreEntries(pageEntries)
+            with timed('statistics'):
+                pageStatistics = calculateStatistics(pageEntries, country)
+                if pageStatistics is not None:
+                    statistics.merge(pageStatistics)
+
+            with timed('encode'):
+                lines = [json.dumps(review) + '\n' for review in encodeReviews(pageEntries)]
+            yield ''.join(lines)
+
+        record = {}
+        if failedPages:
+            app.logger.warning(f'Network error => pages {sorted(failedPages)} failed')
+            failedPagesTotal.inc(len(failedPages))
+            record['failedPages'] = sorted(failedPages)
+
+        if statistics.count:
+            record['statistics'] = statistics.toDict()
+
+        yield json.dumps(record) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+def handleSentimentBatch():
+    ndjson = request.mimetype == 'application/x-ndjson'
+
+    if not ndjson and request.mimetype != 'application/json':
+        raise InvalidUsage('Documents must be sent as application/json or application/x-ndjson', status_code=415)
+
+    maxBytes = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > maxBytes:
+        raise InvalidUsage(f'The body must not be larger than {maxBytes} bytes', status_code=413)
+
+    body = LimitedBody(request.stream, maxBytes)
+    documents = iterDocuments(body, ndjson, maxDocuments=batchMaxDocuments, maxTextLength=batchMaxTextLength)
+
+    # The whole body is read and scored before anything is written back. Clients that only
+    # read the response once their body is sent would otherwise block, and errors in the body
+    # are still answered with a proper status. Results are spooled to disk past a few MB.
+    results = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        for index, result in enumerate(scoreDocuments(documents)):
+            if ndjson:
+                results.write(json.dumps(result).encode('utf-8') + b'\n')
+            else:
+                results.write((b',' if index else b'') + json.dumps(result).encode('utf-8'))
+    except Exception:
+        results.close()
+        raise
+
+    results.seek(0)
+
+    def generate():
+        with results:
+            if not ndjson:
+                yield b'{"documents": ['
+            for chunk in iter(lambda: results.read(64 * 1024), b''):
+                yield chunk
+            if not ndjson:
+                yield b']}'
+
+    response = Response(generate(), mimetype='application/x-ndjson' if ndjson else 'application/json')
     response.headers.add("Access-Control-Allow-Origin", "*")
     return response
 
@@ -75,71 +253,124 @@ def handleAppleReviews():
 # Utility functions
 # ==============================================================================
 
-def calculateStatistics(entries, stopwords):
-    # Arrange
-    averageSentiment = 0
-    averageRating = 0
-    textCorpus = ""
-    stars = []
-    ratings = {} 
-    sentiments = {}
-    statistics = {}
-
-    # Iterate
-    for entry in entries:
-        averageSentiment += entry['sentiment']
-        averageRating += entry['stars']
-        stars.append(entry['stars'])
-        key = entry['version']
-        ratings[key] = ratings.get(key, []) + [entry['stars']]
-        sentiments[key] = sentiments.get(key, []) + [entry['sentiment']]
-        textCorpus += f"{entry['title']} {entry['review']} "
-
-    # Process
-    averageSentiment /= len(entries)
-    averageRating /= len(entries)
-    textCorpus = textCorpus.translate(str.maketrans('', '', string.punctuation))
-    words = Counter(textCorpus.lower().split()).most_common(100)
-    mostCommonWords = {w[0]: w[1] for w in words if w[0] not in stopwords}
-    print(mostCommonWords)
-    ratingDistribution = dict(Counter(stars).most_common(6))
-    ratingPerVersion = dict(map(lambda v: (v[0], sum(v[1]) / len(v[1])), ratings.items()))
-    sentimentPerVersion = dict(map(lambda v: (v[0], sum(v[1]) / len(v[1])), sentiments.items()))
-
-    # Pack
-    statistics['averageRating'] = averageRating
-    statistics['averageSentiment'] = averageSentiment
-    statistics['ratingPerVersion'] = ratingPerVersion
-    statistics['sentimentPerVersion'] = sentimentPerVersion
-    statistics['mostCommonWords'] = mostCommonWords
-    statistics['ratingDistribution'] = ratingDistribution
-    return statistics
+def reviewsResponse(entries, country, failedPages=None):
+    with timed('statistics'):
+        statistics = calculateStatistics(entries, country)
+
+    with timed('encode'):
+        reviews = encodeReviews(entries)
+        jsonResponse = {"reviews" : reviews}
+
+        if failedPages:
+            jsonResponse['failedPages'] = failedPages
+
+        if statistics is not None and statistics.count:
+            jsonResponse['statistics'] = statistics.toDict()
+
+        body = json.dumps(jsonResponse)
+
+    response = Response(body)
+    response.headers['Content-Type'] = 'application/json'
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+def decodeEntries(rawEntries):
+    if strictValidation:
+        return AppStoreEntry(many=True).load(rawEntries)
+    return ReviewRecord.decodeMany(rawEntries)
+
+def encodeReviews(entries):
+    if strictValidation:
+        return Review(many=True).dump([dict(entry) for entry in entries])
+    return [entry.toReview() for entry in entries]
+
+def scoreEntries(entries):
+    documents = [(entry['id'], entry['title'] + '. ' + entry['review']) for entry in entries]
+    sentiments = sentimentCache.analyseMany(documents, scorer)
+
+    for entry, sentiment in zip(entries, sentiments):
+        entry['sentiment'] = sentiment['compound']
+
+def scoreDocuments(documents):
+    while True:
+        batch = list(itertools.islice(documents, batchSize))
+        if not batch:
+            return
+
+        # Ad hoc documents bypass the sentiment cache, they would evict the review scores.
+        with timed('score'):
+            sentiments = scorer.score([document.text for document in batch])
+
+        for document, sentiment in zip(batch, sentiments):
+            result = dict(sentiment)
+            if document.id is not None:
+                result['id'] = document.id
+            if document.language is not None:
+                result['language'] = document.language
+            yield result
+
+def calculateStatistics(entries, country):
+    try:
+        statistics = Statistics(localStopwords(country))
+        for entry in entries:
+            statistics.add(entry)
+        return statistics
+    except Exception as error:
+        app.logger.warning(f'Statistics error => {error}')
+        return None
 
 def localStopwords(country):
     if country == 'nl':
-        return nltk.corpus.stopwords.words('dutch')
+        return artifacts.stopwords['dutch']
     elif country == 'fr' or country == 'be':
-        return nltk.corpus.stopwords.words('french')
+        return artifacts.stopwords['french']
     elif country == 'de':
-        return nltk.corpus.stopwords.words('german')
+        return artifacts.stopwords['german']
     else:
-        return nltk.corpus.stopwords.words('english')
+        return artifacts.stopwords['english']
+
+@contextlib.contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stageSeconds.observe(elapsed, stage=stage)
+        if has_request_context():
+            g.timings.append((stage, elapsed))
+
+# ==============================================================================
+# Instrumentation
+# ==============================================================================
 
-async def fetch_appstore_reviews(session, url):
-    async with session.get(url) as resp:
-        reviews = await resp.text()
-        return json.loads(reviews)['feed']['entry']
+@app.before_request
+def startInstrumentation():
+    g.start = time.perf_counter()
+    g.timings = []
+    g.profiler = None
 
-async def get_appstore_reviews(country, appID, pages):
-    async with aiohttp.ClientSession() as session:
-        tasks = []
+    if profilingEnabled and request.args.get('profile') in ('1', 'true'):
+        g.profiler = SamplingProfiler().start()
 
-        for page in range(1, pages + 1):
-            url = f"https://itunes.apple.com/{country}/rss/customerreviews/page={page}/id={appID}/sortby=mostrecent/json"
-            tasks.append(asyncio.create_task(fetch_appstore_reviews(session, url))) 
-        
-        jsonEntries = await asyncio.gather(*tasks)
-        return [item for sublist in jsonEntries for item in sublist]
+@app.after_request
+def finishInstrumentation(response):
+    elapsed = time.perf_counter() - g.start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    requestSeconds.observe(elapsed, route=route, status=response.status_code)
+
+    timings = [f'{stage};dur={duration * 1000:.2f}' for stage, duration in g.timings]
+    timings.append(f'total;dur={elapsed * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    metrics.dumpIfDue()
+
+    if g.profiler is not None:
+        path = os.path.join(profileDirectory, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{request.endpoint}.folded')
+        with open(path, 'w') as file:
+            file.write(g.profiler.stop().folded())
+        app.logger.info(f'Profile => {path}')
+
+    return response
 
 # ==============================================================================
 # Error handling
@@ -171,3 +402,6 @@ def validateAppStoreParameters(country, appID, pages):
     if pages < 1 or pages > 10:
         raise InvalidUsage('pages must be between 1 and 10', status_code=400)
 
+def validateStoreParameters(limit):
+    if limit < 1 or limit > 10000:
+        raise InvalidUsage('limit must be between 1 and 10000', status_code=400)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time, random, asyncio, argparse, threading
+from aiohttp import web
+
+# ==============================================================================
+# Fake AppStore
+# ==============================================================================
+
+LANGUAGES = {
+    'en': (['Great app', 'Terrible update', 'Love it', 'Not bad', 'Disappointed'],
+           ['This app is great', 'It crashes all the time', 'I love the new design', 'The update is slow and buggy',
+            'Customer support was really helpful', 'Works fine most of the time', 'I hate the ads', 'Best app ever']),
+    'nl': (['Geweldige app', 'Slechte update', 'Prima', 'Teleurgesteld', 'Heel fijn'],
+           ['Deze app is geweldig', 'Hij crasht de hele tijd', 'Ik ben blij met het nieuwe ontwerp', 'De update is traag',
+            'De klantenservice was erg behulpzaam', 'Werkt meestal prima', 'Ik haat de advertenties', 'Beste app ooit']),
+    'fr': (['Super appli', 'Mauvaise mise à jour', 'Pas mal', 'Déçu', 'Génial'],
+           ["Cette application est géniale", "Elle plante tout le temps", "J'adore le nouveau design", "La mise à jour est lente",
+            "Le support client était très utile", "Fonctionne bien la plupart du temps", "Je déteste les publicités"]),
+    'de': (['Tolle App', 'Schlechtes Update', 'Nicht schlecht', 'Enttäuscht', 'Super'],
+           ['Diese App ist toll', 'Sie stürzt ständig ab', 'Ich liebe das neue Design', 'Das Update ist langsam',
+            'Der Kundenservice war sehr hilfreich', 'Funktioniert meistens gut', 'Ich hasse die Werbung']),
+}
+COUNTRY_LANGUAGES = {'nl': 'nl', 'be': 'nl', 'fr': 'fr', 'de': 'de'}
+URL_PATH = '/{country}/rss/customerreviews/page={page}/id={appID}/sortby=mostrecent/json'
+
+def makeFeed(country, appID, page, reviewsPerPage=50):
+    # Deterministic per (country, appID, page), so every run scores the same reviews.
+    generator = random.Random(f'{country}/{appID}/{page}')
+    language = COUNTRY_LANGUAGES.get(country, 'en')
+    entries = []
+
+    for index in range(reviewsPerPage):
+        # One review in five is written in another language, as in real multilingual storefronts.
+        titles, sentences = LANGUAGES[language if generator.random() > 0.2 else generator.choice(list(LANGUAGES))]
+        number = (page - 1) * reviewsPerPage + index
+        entries.append({
+            'id': {'label': f'{appID}{number:08d}'},
+            'author': {'name': {'label': f'user{generator.randrange(100000)}'}},
+            'title': {'label': generator.choice(titles)},
+            'content': {'label': '. '.join(generator.choice(sentences) for _ in range(generator.randint(1, 6))) + '!'},
+            'im:rating': {'label': str(generator.randint(1, 5))},
+            'im:version': {'label': f'1.{generator.randint(0, 9)}'},
+            'updated': {'label': time.strftime('%Y-%m-%dT%H:%M:%S-07:00', time.gmtime(1700000000 - number * 3600))},
+        })
+
+    return {'feed': {'entry': entries}}
+
+class FakeAppStore():
+    """
+    Local stand-in for the itunes RSS review feed, serving `pages` synthetic
+    pages per app after `latency` seconds, plus up to `jitter` random seconds.
+    """
+
+    def __init__(self, pages=10, latency=0.05, jitter=0.0, reviewsPerPage=50, host='127.0.0.1', port=0):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.reviewsPerPage = reviewsPerPage
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._loop = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}' + URL_PATH
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name='fake-appstore', daemon=True).start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _start(self):
+        application = web.Application()
+        application.router.add_get(URL_PATH, self._handle)
+        self._runner = web.AppRunner(application, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def _handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        page = int(request.match_info['page'])
+
+        if page > self.pages:
+            return web.json_response({'feed': {}})
+
+        return web.json_response(makeFeed(request.match_info['country'], request.match_info['appID'], page, self.reviewsPerPage))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves synthetic AppStore review feeds.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    arguments = parser.parse_args()
+
+    store = FakeAppStore(arguments.pages, arguments.latency, arguments.jitter, port=arguments.port).start()
+    print(f'Serving {store.url}')
+    threading.Event().wait()
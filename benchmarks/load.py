@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, json, time, socket, argparse, subprocess, statistics, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakestore import FakeAppStore
+
+# ==============================================================================
+# End-to-end load test
+# ==============================================================================
+
+def freePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def startApp(appStoreURL, port, environment=None):
+    # The app runs in its own process, so the load generator does not compete with it for the GIL.
+    env = dict(os.environ, APPSTORE_URL=appStoreURL, **(environment or {}))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--with-threads'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1).read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('The application exited during startup')
+            time.sleep(0.1)
+
+    process.terminate()
+    raise RuntimeError('The application did not start within 60 seconds')
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def runLoad(urls, concurrency):
+    def timedRequest(url):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+            return time.perf_counter() - start, True
+        except OSError:
+            return time.perf_counter() - start, False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(timedRequest, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, succeeded in results if succeeded]
+    return dict(
+        concurrency=concurrency,
+        requests=len(urls),
+        errors=len(urls) - len(latencies),
+        throughput=len(latencies) / elapsed,
+        p50=percentile(latencies, 0.5) if latencies else None,
+        p99=percentile(latencies, 0.99) if latencies else None,
+        mean=statistics.mean(latencies) if latencies else None)
+
+def runScenarios(pages=10, concurrency=8, requests=200, latency=0.05, jitter=0.0, apps=20):
+    # Requests cycle over `apps` appIDs, so the page cache serves part but not all of the traffic.
+    # Every scenario uses its own appIDs, so it does not start with the caches of the previous one.
+    store = FakeAppStore(pages=pages, latency=latency, jitter=jitter).start()
+    port = freePort()
+    process = startApp(store.url, port)
+    results = dict(pages=pages, latency=latency, jitter=jitter, apps=apps)
+
+    try:
+        for name, query in (('reviews', ''), ('stream', '&stream=1')):
+            urls = [f'http://127.0.0.1:{port}/apple/reviews?country=nl&appID={name}{index % apps}&pages={pages}{query}' for index in range(requests)]
+            results[name] = runLoad(urls, concurrency)
+        results['upstreamRequests'] = store.requests
+    finally:
+        process.terminate()
+        process.wait()
+        store.stop()
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures /apple/reviews latency and throughput against a fake AppStore.')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the fake AppStore takes per page')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra seconds per page')
+    parser.add_argument('--apps', type=int, default=20, help='number of distinct appIDs requested')
+    arguments = parser.parse_args()
+    print(json.dumps(runScenarios(arguments.pages, arguments.concurrency, arguments.requests, arguments.latency, arguments.jitter, arguments.apps)))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, copy, json, time, argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakestore import makeFeed
+from src.artifacts import loadArtifacts
+from src.models import AppStoreEntry, Review, ReviewRecord
+from src.sentiments import Sentiments
+from src.statistics import Statistics
+
+# ==============================================================================
+# Micro benchmarks
+# ==============================================================================
+
+def bestOf(repeat, function):
+    # Best wall clock time of `repeat` runs, the least disturbed by the rest of the machine.
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def rawEntries(country, pages):
+    return [entry for page in range(1, pages + 1) for entry in makeFeed(country, 'bench', page)['feed']['entry']]
+
+def benchmarkScoring(analyzer, texts, repeat):
+    results = {}
+    results['analyse'] = bestOf(repeat, lambda: [Sentiments.analyse(text, analyzer) for text in texts])
+    results['analyseBatch'] = bestOf(repeat, lambda: Sentiments.analyseBatch(texts, analyzer))
+    return {f'{name}ReviewsPerSecond': len(texts) / seconds for name, seconds in results.items()}
+
+def benchmarkDecoding(entries, repeat):
+    # The schemas mutate the feed entries, so each run gets a fresh copy, timed separately.
+    copies = [copy.deepcopy(entries) for _ in range(repeat)]
+    schemaLoad = bestOf(repeat, lambda: AppStoreEntry(many=True).load(copies.pop()))
+    records = ReviewRecord.decodeMany(entries)
+    for record in records:
+        record.sentiment = 0.0
+
+    return dict(
+        recordDecodeSeconds=bestOf(repeat, lambda: ReviewRecord.decodeMany(entries)),
+        schemaLoadSeconds=schemaLoad,
+        recordEncodeSeconds=bestOf(repeat, lambda: [record.toReview() for record in records]),
+        schemaDumpSeconds=bestOf(repeat, lambda: Review(many=True).dump([dict(record) for record in records])))
+
+def benchmarkStatistics(records, stopwords, repeat):
+    def build():
+        statistics = Statistics(stopwords)
+        for record in records:
+            statistics.add(record)
+        return statistics.toDict()
+
+    return dict(statisticsSeconds=bestOf(repeat, build))
+
+def runMicro(pages=10, repeat=5, country='us'):
+    artifacts = loadArtifacts()
+    analyzer = Sentiments.analyzer(artifacts.lexicon)
+    entries = rawEntries(country, pages)
+    records = ReviewRecord.decodeMany(entries)
+    texts = [f'{record.title}. {record.review}' for record in records]
+
+    for record, scores in zip(records, Sentiments.analyseBatch(texts, analyzer)):
+        record.sentiment = scores['compound']
+
+    results = dict(reviews=len(records), repeat=repeat)
+    results.update(benchmarkScoring(analyzer, texts, repeat))
+    results.update(benchmarkDecoding(entries, repeat))
+    results.update(benchmarkStatistics(records, artifacts.stopwords['english'], repeat))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures scoring, decoding and statistics throughput on synthetic feeds.')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--country', default='us')
+    arguments = parser.parse_args()
+    print(json.dumps(runMicro(arguments.pages, arguments.repeat, arguments.country)))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, json, time, platform, argparse, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.startup import measureStartup
+from benchmarks.micro import runMicro
+from benchmarks.load import runScenarios
+
+# ==============================================================================
+# Benchmark suite
+# ==============================================================================
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return dict(commit=commit, python=platform.python_version(), machine=platform.machine(), cpus=os.cpu_count(), timestamp=time.time())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the startup, micro and load benchmarks and writes their results as JSON.')
+    parser.add_argument('--output', help='file to write the results to, printed when omitted')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--skip-load', action='store_true', help='only run the startup and micro benchmarks')
+    arguments = parser.parse_args()
+
+    results = dict(environment=environment())
+    results['startup'] = measureStartup(arguments.repeat)
+    results['micro'] = runMicro(arguments.pages, arguments.repeat)
+    if not arguments.skip_load:
+        results['load'] = runScenarios(arguments.pages, arguments.concurrency, arguments.requests, arguments.latency)
+
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
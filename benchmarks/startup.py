@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, json, time, argparse, statistics, subprocess
+
+# ==============================================================================
+# Worker startup benchmark
+# ==============================================================================
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_APP = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+def measureStartup(runs):
+    # Every run is a fresh interpreter, like a freshly started worker.
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+
+    return dict(runs=runs, median=statistics.median(timings), min=min(timings), max=max(timings))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the time needed to import the application in a new process.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-median', type=float, help='fail when the median startup time in seconds exceeds this value')
+    arguments = parser.parse_args()
+
+    result = measureStartup(arguments.runs)
+    result['timestamp'] = time.time()
+    print(json.dumps(result))
+
+    if arguments.max_median is not None and result['median'] > arguments.max_median:
+        sys.exit(f"Median startup time {result['median']:.3f}s exceeds {arguments.max_median:.3f}s")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, gc, glob, tempfile
+
+# ==============================================================================
+# Gunicorn configuration
+# ==============================================================================
+
+# Load the application, with its lexicon and stopwords, once in the master
+# process. Workers share those pages copy-on-write instead of loading their own.
+preload_app = True
+
+# Workers write their metrics to this directory, so /metrics covers all of them.
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='sentiment-metrics-'))
+
+def on_starting(server):
+    # Totals of a previous run must not be added to this one.
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], 'metrics-*.json')):
+        os.remove(path)
+
+def when_ready(server):
+    # Keep the garbage collector from touching, and so copying, the preloaded objects.
+    gc.freeze()
+
+def post_worker_init(worker):
+    from app import scorer
+    scorer.warm()
+
+def worker_exit(server, worker):
+    # Keep the final totals of the worker, they stay part of the merged counters.
+    from app import metrics
+    metrics.dump()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, pickle, hashlib, logging, nltk
+from collections import namedtuple
+from src.sentiments import Sentiments
+
+# ==============================================================================
+# Precompiled resources
+# ==============================================================================
+
+Artifacts = namedtuple('Artifacts', ['nltkVersion', 'sources', 'version', 'lexicon', 'stopwords'])
+
+LANGUAGES = ('english', 'dutch', 'french', 'german')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join(ROOT, 'resources', 'artifacts.pickle')
+DUTCH_LEXICON_PATH = os.path.join(ROOT, 'resources', 'dutch_lexicon.py')
+VADER_LEXICON = 'sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt'
+
+def sourceDigests():
+    # Digests of everything the resources are built from. nltk data may be missing
+    # where the service runs, its sources are left out then and cannot be checked.
+    digests = {'nltk': nltk.__version__, 'languages': ','.join(LANGUAGES)}
+
+    with open(DUTCH_LEXICON_PATH, 'rb') as file:
+        digests['dutch_lexicon'] = hashlib.sha1(file.read()).hexdigest()
+
+    for name, resource in [('vader_lexicon', VADER_LEXICON)] + [(f'stopwords/{language}', f'corpora/stopwords/{language}') for language in LANGUAGES]:
+        try:
+            with nltk.data.find(resource).open() as file:
+                digests[name] = hashlib.sha1(file.read()).hexdigest()
+        except LookupError:
+            pass
+
+    return digests
+
+def staleSources(artifacts):
+    current = sourceDigests()
+    return sorted(name for name, digest in current.items() if artifacts.sources.get(name) != digest)
+
+def buildArtifacts(download=False):
+    # Merges VADER's lexicon with the Dutch one and collects the stopwords, this is the slow path.
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    from resources.dutch_lexicon import dutch_lexicon
+
+    if download:
+        nltk.download('vader_lexicon', quiet=True)
+        nltk.download('stopwords', quiet=True)
+
+    analyzer = SentimentIntensityAnalyzer()
+    analyzer.lexicon.update(dutch_lexicon)
+
+    stopwords = {}
+    for language in LANGUAGES:
+        try:
+            stopwords[language] = frozenset(nltk.corpus.stopwords.words(language))
+        except LookupError:
+            logging.getLogger(__name__).warning(f'Stopwords for {language} are not available')
+            stopwords[language] = frozenset()
+
+    return Artifacts(nltk.__version__, sourceDigests(), Sentiments.version(analyzer), analyzer.lexicon, stopwords)
+
+def loadArtifacts(path=DEFAULT_PATH):
+    try:
+        with open(path, 'rb') as file:
+            data = pickle.load(file)
+    except FileNotFoundError:
+        logging.getLogger(__name__).warning(f'No precompiled resources at {path}, building them instead')
+        return buildArtifacts()
+
+    if set(data) != set(Artifacts._fields):
+        logging.getLogger(__name__).warning(f'Precompiled resources at {path} have an outdated format, building them instead')
+        return buildArtifacts()
+
+    artifacts = Artifacts(**data)
+    stale = staleSources(artifacts)
+    if stale:
+        logging.getLogger(__name__).warning(f'Precompiled resources at {path} are older than {", ".join(stale)}, building them instead')
+        return buildArtifacts()
+
+    return artifacts
+
+def saveArtifacts(artifacts, path=DEFAULT_PATH):
+    temporaryPath = f'{path}.{os.getpid()}'
+    with open(temporaryPath, 'wb') as file:
+        pickle.dump(artifacts._asdict(), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporaryPath, path)
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    saveArtifacts(buildArtifacts(download=True), path)
+    print(f'Precompiled resources written to {path}')
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time, hashlib, threading
+from collections import OrderedDict
+from src.database import Database
+
+# ==============================================================================
+# Cache definitions
+# ==============================================================================
+
+class LRUCache():
+    """
+    Thread-safe LRU cache bounded by the total size of its items. Items expire
+    after `ttl` seconds, or never when `ttl` is None.
+    """
+
+    def __init__(self, maxSize, ttl=None, clock=time.monotonic):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is not None and item[0] is not None and item[0] <= self.clock():
+                self._remove(key)
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._items.move_to_end(key)
+            return item[2]
+
+    def put(self, key, value, size=1):
+        if size > self.maxSize:
+            return
+
+        expires = None if self.ttl is None else self.clock() + self.ttl
+
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+
+            self._items[key] = (expires, size, value)
+            self.size += size
+
+            while self.size > self.maxSize:
+                self._remove(next(iter(self._items)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def stats(self):
+        return dict(items=len(self._items), size=self.size, maxSize=self.maxSize, hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def _remove(self, key):
+        item = self._items.pop(key)
+        self.size -= item[1]
+
+class SentimentCache():
+    """
+    Memo of sentiment scores keyed by review id, a hash of the scored text and
+    the analyzer version. Scores are kept in a bounded in-memory LRU cache and,
+    when `path` is given, in a SQLite database shared by all workers. The
+    database keeps at most `maxRows` scores, the oldest written are pruned.
+    """
+
+    columns = ('count', 'compound', 'negative', 'neutral', 'positive')
+
+    def __init__(self, version, maxItems=100000, path=None, maxRows=1000000):
+        self.version = version
+        self.path = path
+        self.maxRows = maxRows
+        self.memory = LRUCache(maxItems)
+        self._lock = threading.Lock()
+        self._database = Database(path, self._createSchema) if path is not None else None
+        self._unpruned = 0
+
+    def key(self, reviewID, text):
+        return hashlib.sha1(f'{self.version}\0{reviewID}\0{text}'.encode('utf-8')).hexdigest()
+
+    def analyseMany(self, documents, scorer):
+        keys = [self.key(reviewID, text) for reviewID, text in documents]
+        scores = self.getMany(keys)
+        missing = {}
+
+        for key, (_, text) in zip(keys, documents):
+            if key not in scores and key not in missing:
+                missing[key] = text
+
+        missing = dict(zip(missing.keys(), scorer.score(list(missing.values()))))
+        self.putMany(missing)
+        scores.update(missing)
+        return [scores[key] for key in keys]
+
+    def getMany(self, keys):
+        scores = {}
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                scores[key] = value
+
+        remaining = [key for key in keys if key not in scores]
+        if remaining and self.path is not None:
+            with self._lock:
+                db = self._database.connect()
+                for start in range(0, len(remaining), 500):
+                    chunk = remaining[start:start + 500]
+                    query = f"SELECT key, {', '.join(self.columns)} FROM sentiments WHERE key IN ({', '.join('?' * len(chunk))})"
+                    for row in db.execute(query, chunk):
+                        value = dict(zip(self.columns, row[1:]))
+                        self.memory.put(row[0], value)
+                        scores[row[0]] = value
+
+        return scores
+
+    def putMany(self, scores):
+        for key, value in scores.items():
+            self.memory.put(key, value)
+
+        if scores and self.path is not None:
+            with self._lock:
+                db = self._database.connect()
+                written = time.time()
+                with db:
+                    db.executemany(
+                        f"INSERT OR REPLACE INTO sentiments (key, version, written, {', '.join(self.columns)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(key, self.version, written, *(value[column] for column in self.columns)) for key, value in scores.items()])
+
+                # Counting the rows scans the table, so it is only done every tenth of the cap.
+                self._unpruned += len(scores)
+                if self._unpruned >= max(1, self.maxRows // 10):
+                    self._unpruned = 0
+                    self._prune(db)
+
+    def _prune(self, db):
+        excess = db.execute("SELECT COUNT(*) FROM sentiments").fetchone()[0] - self.maxRows
+        if excess > 0:
+            with db:
+                db.execute("DELETE FROM sentiments WHERE key IN (SELECT key FROM sentiments ORDER BY written LIMIT ?)", (excess,))
+
+    def stats(self):
+        return self.memory.stats()
+
+    def _createSchema(self, db):
+        # Other versions are left alone, workers of a rolling deploy share the file and
+        # their keys never match, so old rows just age out.
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sentiments (key TEXT PRIMARY KEY, version TEXT, written REAL, count INTEGER, "
+            "compound REAL, negative REAL, neutral REAL, positive REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS sentiments_by_written ON sentiments (written)")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sqlite3, threading
+
+# ==============================================================================
+# SQLite connections
+# ==============================================================================
+
+class Database():
+    """
+    SQLite file shared by the workers, opened lazily in WAL mode. Every process
+    opens its own connection and runs `createSchema(db)` on it first.
+    """
+
+    def __init__(self, path, createSchema):
+        self.path = path
+        self.createSchema = createSchema
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db = None
+
+    def connect(self):
+        # SQLite connections must not be shared with forked workers.
+        if self._pid == os.getpid():
+            return self._db
+
+        with self._lock:
+            if self._pid != os.getpid():
+                db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                with db:
+                    self.createSchema(db)
+                self._db = db
+                self._pid = os.getpid()
+
+        return self._db
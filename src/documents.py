@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json, codecs, itertools
+from collections import namedtuple
+from werkzeug.exceptions import RequestEntityTooLarge
+from src.errors import InvalidUsage
+
+# ==============================================================================
+# Document parsing
+# ==============================================================================
+
+Document = namedtuple('Document', ['id', 'text', 'language'])
+
+class LimitedBody():
+    """
+    Request body stream answering with a 413 once more than `maxBytes` are read.
+    Older Werkzeug versions do not enforce MAX_CONTENT_LENGTH on request.stream,
+    and bodies sent without a Content-Length cannot be checked up front.
+    """
+
+    def __init__(self, stream, maxBytes):
+        self.stream = stream
+        self.maxBytes = maxBytes
+        self.remaining = maxBytes
+
+    def read(self, size=-1):
+        return self._count(self.stream.read, size)
+
+    def readline(self, size=-1):
+        return self._count(self.stream.readline, size)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def _count(self, read, size):
+        try:
+            data = read(size)
+        except RequestEntityTooLarge:
+            data = None
+
+        if data is None or len(data) > self.remaining:
+            raise InvalidUsage(f'The body must not be larger than {self.maxBytes} bytes', status_code=413)
+
+        self.remaining -= len(data)
+        return data
+
+def iterDocuments(stream, ndjson=False, maxDocuments=100000, maxTextLength=10000):
+    # Escaped as JSON, a character takes at most 12 characters, the other fields get the rest.
+    items = iterJSONLines(stream) if ndjson else iterJSONArray(stream, maxValueLength=maxTextLength * 12 + 64 * 1024)
+
+    for index, item in enumerate(items):
+        if index >= maxDocuments:
+            raise InvalidUsage(f'A batch can contain at most {maxDocuments} documents', status_code=413)
+
+        yield parseDocument(item, index, maxTextLength)
+
+def parseDocument(item, index, maxTextLength):
+    if isinstance(item, str):
+        item = {'text': item}
+
+    if not isinstance(item, dict):
+        raise InvalidUsage(f'Document {index} must be a string or an object', status_code=400)
+
+    text = item.get('text')
+    if not isinstance(text, str) or not text.strip():
+        raise InvalidUsage(f'Document {index} is missing its text', status_code=400)
+
+    if len(text) > maxTextLength:
+        raise InvalidUsage(f'Document {index} is longer than {maxTextLength} characters', status_code=413)
+
+    id = item.get('id')
+    if id is not None and not isinstance(id, (str, int)):
+        raise InvalidUsage(f'Document {index} has an invalid id', status_code=400)
+
+    language = item.get('language')
+    if language is not None and not isinstance(language, str):
+        raise InvalidUsage(f'Document {index} has an invalid language', status_code=400)
+
+    return Document(id, text, language)
+
+def iterJSONLines(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise InvalidUsage(f'Line {number} is not valid JSON', status_code=400)
+
+def iterJSONArray(stream, chunkSize=64 * 1024, maxValueLength=None):
+    # Decodes the elements of a top level JSON array one by one, reading the body in chunks.
+    # A value spanning several chunks is decoded again from its start after every chunk,
+    # so values longer than `maxValueLength` are rejected before that gets expensive.
+    decoder = json.JSONDecoder()
+    textDecoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    exhausted = False
+
+    def readMore():
+        nonlocal buffer, position, exhausted
+        if exhausted:
+            return False
+
+        chunk = stream.read(chunkSize)
+        exhausted = not chunk
+        buffer = buffer[position:] + textDecoder.decode(chunk, final=exhausted)
+        position = 0
+        return True
+
+    def nextCharacter():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+
+            if position < len(buffer):
+                return buffer[position]
+
+            if not readMore():
+                return ''
+
+    if nextCharacter() != '[':
+        raise InvalidUsage('The body must be a JSON array of documents', status_code=400)
+
+    position += 1
+    if nextCharacter() == ']':
+        position += 1
+        expectEnd(nextCharacter())
+        return
+
+    for index in itertools.count():
+        if not nextCharacter():
+            raise InvalidUsage('The body must be a JSON array of documents', status_code=400)
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+
+            # A value reaching the end of the buffer might continue in the next chunk,
+            # so might a number followed by the start of its fraction or exponent.
+            if end is not None and end < len(buffer) and not (buffer[end] in '.eE' and isinstance(item, (int, float))):
+                break
+
+            if maxValueLength is not None and len(buffer) - position > maxValueLength:
+                raise InvalidUsage(f'Document {index} is longer than {maxValueLength} characters of JSON', status_code=413)
+
+            if not readMore():
+                if end is None:
+                    raise InvalidUsage('The body must be a JSON array of documents', status_code=400)
+                break
+
+        position = end
+        yield item
+
+        character = nextCharacter()
+        if character == ']':
+            position += 1
+            expectEnd(nextCharacter())
+            return
+
+        if character != ',':
+            raise InvalidUsage('The body must be a JSON array of documents', status_code=400)
+        position += 1
+
+def expectEnd(character):
+    if character:
+        raise InvalidUsage('The body must not continue after the array of documents', status_code=400)
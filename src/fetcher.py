@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, json, time, random, asyncio, threading, aiohttp
+from concurrent.futures import as_completed
+from collections import namedtuple
+
+# ==============================================================================
+# AppStore fetching
+# ==============================================================================
+
+FetchResult = namedtuple('FetchResult', ['entries', 'failedPages'])
+
+class AppStoreFetcher():
+    """
+    Long-lived AppStore client. Every worker process owns a single event loop,
+    running in a daemon thread, and a single pooled aiohttp session, so DNS and
+    TLS state to itunes.apple.com is reused between requests.
+
+    Raw pages are kept in an optional cache keyed by (country, appID, page), and
+    concurrent requests for the same page share a single upstream fetch.
+
+    `onRequest(seconds, outcome=...)` is called after every upstream request,
+    with an outcome of 'ok', 'timeout', 'error' or the failing HTTP status.
+    """
+
+    url = "https://itunes.apple.com/{country}/rss/customerreviews/page={page}/id={appID}/sortby=mostrecent/json"
+
+    def __init__(self, maxConcurrency=20, pageTimeout=5.0, retries=2, backoff=0.2, maxBackoff=2.0, cache=None, onRequest=None, url=None):
+        self.maxConcurrency = maxConcurrency
+        self.pageTimeout = pageTimeout
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.cache = cache
+        self.onRequest = onRequest
+        if url is not None:
+            self.url = url
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._inflight = {}
+
+    def fetch(self, country, appID, pages):
+        loop = self._ensureLoop()
+        future = asyncio.run_coroutine_threadsafe(self._fetchPages(country, appID, pages), loop)
+        return future.result()
+
+    def fetchPage(self, country, appID, page):
+        # Entries of a single page, or None when it failed.
+        loop = self._ensureLoop()
+        return asyncio.run_coroutine_threadsafe(self._fetchPage(country, appID, page), loop).result()
+
+    def iterPages(self, country, appID, pages):
+        # Yields (page, entries) in completion order, entries is None for failed pages.
+        loop = self._ensureLoop()
+        futures = {asyncio.run_coroutine_threadsafe(self._fetchPage(country, appID, page), loop): page for page in range(1, pages + 1)}
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def stats(self):
+        stats = self.cache.stats() if self.cache is not None else {}
+        stats['coalesced'] = self.coalesced
+        return stats
+
+    def close(self):
+        if self._pid != os.getpid() or self._loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._pid = None
+
+    # ==========================================================================
+    # Event loop
+    # ==========================================================================
+
+    def _ensureLoop(self):
+        # The loop thread does not survive a fork, so each worker starts its own.
+        if self._pid == os.getpid():
+            return self._loop
+
+        with self._lock:
+            if self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='appstore-fetcher', daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._startSession(), loop).result()
+                self._loop = loop
+                self._pid = os.getpid()
+
+        return self._loop
+
+    async def _startSession(self):
+        connector = aiohttp.TCPConnector(limit=self.maxConcurrency, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._semaphore = asyncio.Semaphore(self.maxConcurrency)
+        self._inflight = {}
+
+    # ==========================================================================
+    # Fetching
+    # ==========================================================================
+
+    async def _fetchPages(self, country, appID, pages):
+        tasks = [self._fetchPage(country, appID, page) for page in range(1, pages + 1)]
+        results = await asyncio.gather(*tasks)
+
+        entries = []
+        failedPages = []
+        for page, pageEntries in enumerate(results, start=1):
+            if pageEntries is None:
+                failedPages.append(page)
+            else:
+                entries.extend(pageEntries)
+
+        return FetchResult(entries, failedPages)
+
+    async def _fetchPage(self, country, appID, page):
+        key = (country.lower(), appID, page)
+
+        if self.cache is not None:
+            text = self.cache.get(key)
+            if text is not None:
+                return parseFeed(text)
+
+        # Only one upstream request per page is in flight, the others wait for it.
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(inflight)
+            return None if result is None else parseFeed(result[0])
+
+        inflight = asyncio.ensure_future(self._downloadPage(country, appID, page))
+        self._inflight[key] = inflight
+        try:
+            result = await asyncio.shield(inflight)
+        finally:
+            self._inflight.pop(key, None)
+
+        if result is None:
+            return None
+
+        text, entries = result
+        if self.cache is not None:
+            self.cache.put(key, text, size=len(text))
+
+        return entries
+
+    async def _downloadPage(self, country, appID, page):
+        url = self.url.format(country=country, page=page, appID=appID)
+        timeout = aiohttp.ClientTimeout(total=self.pageTimeout)
+
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    async with self._session.get(url, timeout=timeout) as resp:
+                        resp.raise_for_status()
+                        reviews = await resp.text()
+                    result = reviews, parseFeed(reviews)
+                    outcome = 'ok'
+                except aiohttp.ClientResponseError as error:
+                    result = None
+                    outcome = str(error.status)
+                except asyncio.TimeoutError:
+                    result = None
+                    outcome = 'timeout'
+                except (aiohttp.ClientError, ValueError, KeyError):
+                    result = None
+                    outcome = 'error'
+
+            if self.onRequest is not None:
+                self.onRequest(time.perf_counter() - start, outcome=outcome)
+
+            if result is not None:
+                return result
+
+            if outcome.isdigit() and int(outcome) < 500 and outcome != '429':
+                return None
+
+            if attempt < self.retries:
+                await asyncio.sleep(random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** attempt)))
+
+        return None
+
+def parseFeed(text):
+    feed = json.loads(text)['feed']
+    entries = feed.get('entry', [])
+    # A feed with a single review holds the entry itself instead of a list.
+    return [entries] if isinstance(entries, dict) else entries
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os, sys, json, glob, time, bisect, threading
+from collections import Counter as FrameCounter
+
+# ==============================================================================
+# Metric definitions
+# ==============================================================================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Registry():
+    """
+    Collection of metrics rendered in the Prometheus text exposition format.
+
+    With a `directory`, every process writes snapshots of its metrics to its
+    own file there, and rendering merges the files of all processes. Counters
+    and histograms are summed, including those of workers that have exited.
+    Gauges describe live processes only and get a `pid` label.
+    """
+
+    def __init__(self, directory=None, dumpInterval=1.0):
+        self.metrics = []
+        self.directory = directory
+        self.dumpInterval = dumpInterval
+        self._lastDump = 0
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        if self.directory is None:
+            snapshots = {metric.name: metric.snapshot() for metric in self.metrics}
+        else:
+            self.dump()
+            snapshots = self._mergeSnapshots()
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            labelNames = ('pid',) + metric.labelNames if self.directory is not None and metric.type == 'gauge' else metric.labelNames
+            lines.extend(metric.samples(snapshots.get(metric.name, {}), labelNames))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self):
+        if self.directory is None:
+            return
+
+        self._lastDump = time.monotonic()
+        snapshot = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()] for metric in self.metrics}
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(f'{path}.tmp', path)
+
+    def dumpIfDue(self):
+        if self.directory is not None and time.monotonic() - self._lastDump >= self.dumpInterval:
+            self.dump()
+
+    def _mergeSnapshots(self):
+        types = {metric.name: metric.type for metric in self.metrics}
+        merged = {name: {} for name in types}
+
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+
+            alive = processAlive(int(pid))
+            for name, values in snapshot.items():
+                if name not in types:
+                    continue
+
+                for key, value in values:
+                    key = tuple(key)
+                    if types[name] == 'gauge':
+                        if alive:
+                            merged[name][(pid,) + key] = value
+                    elif types[name] == 'histogram':
+                        counts = merged[name].get(key)
+                        merged[name][key] = value if counts is None else [a + b for a, b in zip(counts, value)]
+                    else:
+                        merged[name][key] = merged[name].get(key, 0) + value
+
+        return merged
+
+class Counter():
+    type = 'counter'
+
+    def __init__(self, name, help, labelNames=()):
+        self.name = name
+        self.help = help
+        self.labelNames = labelNames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelNames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self, values, labelNames):
+        return [f'{self.name}{formatLabels(labelNames, key)} {value}' for key, value in values.items()]
+
+class Gauge():
+    """
+    Gauge reading its labelled values from `function` at collection time.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, help, function, labelName=None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.labelNames = () if labelName is None else (labelName,)
+
+    def snapshot(self):
+        values = self.function()
+        if not self.labelNames:
+            return {(): values}
+        return {(str(key),): value for key, value in values.items()}
+
+    def samples(self, values, labelNames):
+        return [f'{self.name}{formatLabels(labelNames, key)} {value}' for key, value in values.items()]
+
+class Histogram():
+    type = 'histogram'
+
+    def __init__(self, name, help, labelNames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelNames = labelNames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelNames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, the +Inf bucket, and the sum of all values.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(counts) for key, counts in self._values.items()}
+
+    def samples(self, values, labelNames):
+        samples = []
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = formatLabels(labelNames + ('le',), key + (str(bound),))
+                samples.append(f'{self.name}_bucket{labels} {cumulative}')
+
+            labels = formatLabels(labelNames, key)
+            samples.append(f'{self.name}_sum{labels} {counts[-1]}')
+            samples.append(f'{self.name}_count{labels} {cumulative}')
+        return samples
+
+def processAlive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def formatLabels(names, values):
+    if not names:
+        return ''
+    labels = ','.join(f'{name}="{escapeLabel(value)}"' for name, value in zip(names, values))
+    return f'{{{labels}}}'
+
+def escapeLabel(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# ==============================================================================
+# Profiling
+# ==============================================================================
+
+class SamplingProfiler():
+    """
+    Samples the stack of a single thread every `interval` seconds from a
+    background thread. Stacks are counted in the folded format of flame graph
+    tools, one `frame;frame;frame count` line per distinct stack.
+    """
+
+    def __init__(self, threadID=None, interval=0.005):
+        self.threadID = threading.get_ident() if threadID is None else threadID
+        self.interval = interval
+        self.stacks = FrameCounter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.threadID)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
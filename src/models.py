@@ -86,3 +86,60 @@ class AppStoreEntry(Schema):
         data['version'] = version['label']
         return data
 
+
+# ==============================================================================
+# Record definitions
+# ==============================================================================
+
+class ReviewRecord():
+    """
+    Compact review decoded straight from an AppStore feed entry. Fields can
+    also be read and written like dictionary keys, as with loaded schemas.
+    """
+
+    __slots__ = ('id', 'name', 'title', 'review', 'stars', 'version', 'sentiment')
+
+    def __init__(self, id, name, title, review, stars, version, sentiment=None):
+        self.id = id
+        self.name = name
+        self.title = title
+        self.review = review
+        self.stars = stars
+        self.version = version
+        self.sentiment = sentiment
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def keys(self):
+        return self.__slots__
+
+    @classmethod
+    def decode(cls, entry):
+        return cls(
+            entry['id']['label'],
+            entry['author']['name']['label'],
+            entry['title']['label'],
+            entry['content']['label'],
+            int(entry['im:rating']['label']),
+            entry['im:version']['label'])
+
+    @staticmethod
+    def decodeMany(entries):
+        decode = ReviewRecord.decode
+        return [decode(entry) for entry in entries]
+
+    def toReview(self):
+        # Same output as dumping with the Review schema.
+        review = {'name': self.name or 'Unknown user'}
+        if self.title:
+            review['title'] = self.title
+        review['review'] = self.review
+        review['stars'] = self.stars
+        review['sentiment'] = float(self.sentiment)
+        review['version'] = self.version
+        review['id'] = self.id
+        return review
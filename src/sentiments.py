@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import re
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+import re, hashlib, nltk, os, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+SENTENCE_SEPARATORS = re.compile("[.!?]+")
 
 # ==============================================================================
 # Sentiment analysis functions
@@ -10,7 +13,7 @@ class Sentiments():
     
     @staticmethod
     def analyse(text, analyzer):
-        sentences_list = list(filter(None, re.split("[.!?]+", text)))
+        sentences_list = list(filter(None, SENTENCE_SEPARATORS.split(text)))
         count = len(sentences_list)
         sentiments_list = []
         compound = 0
@@ -29,3 +32,110 @@ class Sentiments():
 
         return dict(sentiments=sentiments_list, count=count, compound=compound/count, negative=negative/count, neutral=neutral/count, positive=positive/count)
 
+    @staticmethod
+    def aggregate(text, analyzer):
+        # Same averages as analyse, without building the per-sentence results.
+        sentences_list = [sentence for sentence in SENTENCE_SEPARATORS.split(text) if sentence]
+        count = len(sentences_list)
+        polarity_scores = analyzer.polarity_scores
+
+        if not count:
+            return dict(count=0, compound=0.0, negative=0.0, neutral=0.0, positive=0.0)
+
+        compound = 0
+        negative = 0
+        neutral = 0
+        positive = 0
+
+        for sentence in sentences_list:
+            result = polarity_scores(sentence)
+            compound += result["compound"]
+            negative += result["neg"]
+            neutral += result["neu"]
+            positive += result["pos"]
+
+        return dict(count=count, compound=compound/count, negative=negative/count, neutral=neutral/count, positive=positive/count)
+
+    @staticmethod
+    def analyseBatch(texts, analyzer):
+        return [Sentiments.aggregate(text, analyzer) for text in texts]
+
+    @staticmethod
+    def analyzer(lexicon):
+        # Builds an analyzer around an already merged lexicon, skipping VADER's lexicon file.
+        analyzer = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+        analyzer.lexicon = lexicon
+        analyzer.constants = VaderConstants()
+        return analyzer
+
+    @staticmethod
+    def version(analyzer):
+        # Identifies the analyzer and its lexicon, scores from other versions are stale.
+        digest = hashlib.sha1(nltk.__version__.encode('utf-8'))
+        for word, valence in sorted(analyzer.lexicon.items()):
+            digest.update(f'{word}\t{valence}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+# ==============================================================================
+# Batch scoring
+# ==============================================================================
+class BatchScorer():
+    """
+    Scores lists of documents with `Sentiments.aggregate`. Batches of at least
+    `minBatch` documents are split into chunks and scored by a pool of
+    `processes` worker processes, each warmed up once with the merged lexicon.
+    """
+
+    def __init__(self, analyzer, processes=0, minBatch=200, chunkSize=50):
+        self.analyzer = analyzer
+        self.processes = processes
+        self.minBatch = minBatch
+        self.chunkSize = chunkSize
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+
+    def score(self, texts):
+        if self.processes < 2 or len(texts) < self.minBatch:
+            return Sentiments.analyseBatch(texts, self.analyzer)
+
+        chunks = [texts[start:start + self.chunkSize] for start in range(0, len(texts), self.chunkSize)]
+        results = self._ensurePool().map(_scoreChunk, chunks)
+        return [scores for chunk in results for scores in chunk]
+
+    def warm(self):
+        if self.processes >= 2:
+            self._ensurePool()
+
+    def close(self):
+        if self._pid == os.getpid() and self._pool is not None:
+            self._pool.shutdown()
+            self._pid = None
+
+    def _ensurePool(self):
+        # Pools are not inherited by forked workers, each worker starts its own.
+        if self._pid == os.getpid():
+            return self._pool
+
+        with self._lock:
+            if self._pid != os.getpid():
+                pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_initWorker,
+                    initargs=(self.analyzer.lexicon,))
+                # Start every process now, so the first request does not pay for it.
+                list(pool.map(_scoreChunk, [[]] * self.processes))
+                self._pool = pool
+                self._pid = os.getpid()
+
+        return self._pool
+
+_workerAnalyzer = None
+
+def _initWorker(lexicon):
+    global _workerAnalyzer
+    _workerAnalyzer = Sentiments.analyzer(lexicon)
+
+def _scoreChunk(texts):
+    return Sentiments.analyseBatch(texts, _workerAnalyzer)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import string
+from collections import Counter
+
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+# ==============================================================================
+# Statistics definitions
+# ==============================================================================
+
+class Statistics():
+    """
+    Review statistics built one entry at a time. Accumulators built with the
+    same stopwords can be merged, so statistics of separate pages or workers
+    can be combined without going through their entries again.
+    """
+
+    def __init__(self, stopwords=()):
+        self.stopwords = frozenset(stopwords)
+        self.count = 0
+        self.ratingSum = 0
+        self.sentimentSum = 0
+        self.stars = Counter()
+        self.versions = {}
+        self.words = Counter()
+
+    def add(self, entry):
+        stars = entry['stars']
+        sentiment = entry['sentiment']
+        self.count += 1
+        self.ratingSum += stars
+        self.sentimentSum += sentiment
+        self.stars[stars] += 1
+
+        version = self.versions.get(entry['version'])
+        if version is None:
+            self.versions[entry['version']] = [1, stars, sentiment]
+        else:
+            version[0] += 1
+            version[1] += stars
+            version[2] += sentiment
+
+        text = f"{entry['title']} {entry['review']}".translate(PUNCTUATION).lower()
+        stopwords = self.stopwords
+        self.words.update(word for word in text.split() if word not in stopwords)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.ratingSum += other.ratingSum
+        self.sentimentSum += other.sentimentSum
+        self.stars.update(other.stars)
+        self.words.update(other.words)
+
+        for key, (count, ratingSum, sentimentSum) in other.versions.items():
+            version = self.versions.setdefault(key, [0, 0, 0])
+            version[0] += count
+            version[1] += ratingSum
+            version[2] += sentimentSum
+
+        return self
+
+    def toDict(self, mostCommon=100):
+        statistics = {}
+        statistics['averageRating'] = self.ratingSum / self.count
+        statistics['averageSentiment'] = self.sentimentSum / self.count
+        statistics['ratingPerVersion'] = {key: v[1] / v[0] for key, v in self.versions.items()}
+        statistics['sentimentPerVersion'] = {key: v[2] / v[0] for key, v in self.versions.items()}
+        statistics['mostCommonWords'] = dict(self.words.most_common(mostCommon))
+        statistics['ratingDistribution'] = dict(self.stars.most_common(6))
+        return statistics
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+from collections import namedtuple
+from src.database import Database
+from src.models import ReviewRecord
+
+# ==============================================================================
+# Review store
+# ==============================================================================
+
+SyncResult = namedtuple('SyncResult', ['added', 'failedPages'])
+
+class ReviewStore():
+    """
+    SQLite store of AppStore reviews keyed by country, appID and review id.
+    Reviews are synced incrementally from the most recent feed pages and are
+    stored unscored. Their sentiment is kept once scored, and dropped when the
+    analyzer `version` changes.
+    """
+
+    columns = ('id', 'name', 'title', 'review', 'stars', 'version', 'sentiment')
+    # The AppStore only serves the 10 most recent pages of a feed.
+    feedPages = 10
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self._lock = threading.Lock()
+        self._database = Database(path, self._createSchema)
+
+    def sync(self, country, appID, fetchPage, pages):
+        # Pages are fetched in order until one holds a review that was already stored,
+        # then the stored history is deepened until it covers the first `pages` pages.
+        # A page that fails or cannot be decoded stops the sync, the pages before it are
+        # kept. When that leaves new reviews apart from the stored ones, the newest stored
+        # review is remembered as a boundary, and later syncs only stop once they reach it.
+        pages = min(pages, self.feedPages)
+        boundary, exhausted = self.syncState(country, appID)
+        newest = self.newestID(country, appID)
+        records = []
+        dates = []
+        failedPages = []
+        ended = False
+        reachedStored = False
+        pageSize = None
+        page = 1
+
+        def fetchNew(page):
+            # Unstored reviews of a page and whether it held stored ones, or None when it failed.
+            rawEntries = fetchPage(page)
+            if rawEntries is None:
+                return None
+
+            try:
+                pageRecords = ReviewRecord.decodeMany(rawEntries)
+                pageDates = [entry.get('updated', {}).get('label') for entry in rawEntries]
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return None
+
+            ids = [record.id for record in pageRecords]
+            known = self.knownIDs(country, appID, ids) if ids else set()
+            for record, date in zip(pageRecords, pageDates):
+                if record.id not in known:
+                    records.append(record)
+                    dates.append(date)
+
+            return ids, known
+
+        while page <= pages:
+            result = fetchNew(page)
+            if result is None:
+                failedPages.append(page)
+                break
+
+            ids, known = result
+            if not ids:
+                ended = True
+                break
+
+            pageSize = pageSize or len(ids)
+            page += 1
+            if known and (boundary is None or boundary in ids):
+                reachedStored = True
+                break
+
+        # The stored reviews follow the new ones without a gap, so the pages they cover are skipped.
+        if reachedStored and not exhausted:
+            page = max(page, (self.count(country, appID) + len(records)) // pageSize + 1)
+            while page <= pages:
+                result = fetchNew(page)
+                if result is None:
+                    failedPages.append(page)
+                    break
+
+                if not result[0]:
+                    ended = True
+                    break
+                page += 1
+
+        if records:
+            self.insert(country, appID, records, dates)
+
+        if reachedStored or ended or newest is None:
+            boundary = None
+        elif boundary is None:
+            boundary = newest
+
+        # Once the end of the feed was reached without a gap, the store holds all of it.
+        exhausted = exhausted or (ended and boundary is None)
+        self.setSyncState(country, appID, boundary, exhausted)
+
+        return SyncResult(len(records), failedPages)
+
+    def knownIDs(self, country, appID, ids):
+        with self._lock:
+            query = f"SELECT id FROM reviews WHERE country = ? AND appID = ? AND id IN ({', '.join('?' * len(ids))})"
+            return {row[0] for row in self._database.connect().execute(query, (country, appID, *ids))}
+
+    def newestID(self, country, appID):
+        with self._lock:
+            row = self._database.connect().execute(
+                "SELECT id FROM reviews WHERE country = ? AND appID = ? ORDER BY updated DESC, rowid DESC LIMIT 1",
+                (country, appID)).fetchone()
+        return None if row is None else row[0]
+
+    def count(self, country, appID):
+        with self._lock:
+            return self._database.connect().execute("SELECT COUNT(*) FROM reviews WHERE country = ? AND appID = ?", (country, appID)).fetchone()[0]
+
+    def syncState(self, country, appID):
+        # The boundary of an unfinished sync, and whether the oldest reviews of the feed are stored.
+        with self._lock:
+            row = self._database.connect().execute("SELECT boundary, exhausted FROM syncs WHERE country = ? AND appID = ?", (country, appID)).fetchone()
+        return (None, False) if row is None else (row[0], bool(row[1]))
+
+    def setSyncState(self, country, appID, boundary, exhausted):
+        with self._lock:
+            db = self._database.connect()
+            with db:
+                db.execute("INSERT OR REPLACE INTO syncs (country, appID, boundary, exhausted) VALUES (?, ?, ?, ?)", (country, appID, boundary, int(exhausted)))
+
+    def insert(self, country, appID, records, dates):
+        # Reviews arrive newest first, they are written oldest first so the row order follows the feed.
+        rows = [(country, appID, *(record[column] for column in self.columns), self.version, date) for record, date in zip(records, dates)]
+        with self._lock:
+            db = self._database.connect()
+            with db:
+                db.executemany(
+                    f"INSERT OR IGNORE INTO reviews (country, appID, {', '.join(self.columns)}, sentimentVersion, updated) "
+                    f"VALUES ({', '.join('?' * (len(self.columns) + 4))})",
+                    reversed(rows))
+
+    def reviews(self, country, appID, limit=None, version=None, since=None):
+        # Reviews whose sentiment is None still have to be scored, see updateSentiments.
+        query = f"SELECT {', '.join(self.columns)} FROM reviews WHERE country = ? AND appID = ?"
+        parameters = [country, appID]
+
+        if version is not None:
+            query += " AND version = ?"
+            parameters.append(version)
+
+        if since is not None:
+            query += " AND updated >= ?"
+            parameters.append(since)
+
+        query += " ORDER BY updated DESC, rowid DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self._lock:
+            return [ReviewRecord(*row) for row in self._database.connect().execute(query, parameters)]
+
+    def updateSentiments(self, country, appID, records):
+        with self._lock:
+            db = self._database.connect()
+            with db:
+                db.executemany(
+                    "UPDATE reviews SET sentiment = ?, sentimentVersion = ? WHERE country = ? AND appID = ? AND id = ?",
+                    [(record.sentiment, self.version, country, appID, record.id) for record in records])
+
+    def _createSchema(self, db):
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS reviews (country TEXT, appID TEXT, id TEXT, name TEXT, title TEXT, review TEXT, "
+            "stars INTEGER, version TEXT, sentiment REAL, sentimentVersion TEXT, updated TEXT, PRIMARY KEY (country, appID, id))")
+        db.execute("CREATE TABLE IF NOT EXISTS syncs (country TEXT, appID TEXT, boundary TEXT, exhausted INTEGER, PRIMARY KEY (country, appID))")
+        db.execute("CREATE INDEX IF NOT EXISTS reviews_by_version ON reviews (country, appID, version)")
+        db.execute("CREATE INDEX IF NOT EXISTS reviews_by_date ON reviews (country, appID, updated)")
+        db.execute("UPDATE reviews SET sentiment = NULL WHERE sentimentVersion != ?", (self.version,))
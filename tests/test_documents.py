@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import io, json, pytest
+from src.documents import iterJSONArray, iterJSONLines, iterDocuments, LimitedBody
+from src.errors import InvalidUsage
+
+# ==============================================================================
+# JSON array parsing
+# ==============================================================================
+
+def parse(body, **options):
+    return list(iterJSONArray(io.BytesIO(body), **options))
+
+def test_empty_array():
+    assert parse(b'[]') == []
+    assert parse(b' [ ] \n') == []
+
+@pytest.mark.parametrize('chunkSize', [1, 2, 3, 5, 7, 64 * 1024])
+def test_values_across_chunks(chunkSize):
+    values = ['good', {'id': 1, 'text': 'bad'}, 12345, 1.5, None, [1, 2]]
+    assert parse(json.dumps(values).encode('utf-8'), chunkSize=chunkSize) == values
+
+def test_value_ending_at_chunk_edge():
+    # The number ends exactly with the first chunk and continues in the second one.
+    assert parse(b'[123,4]', chunkSize=4) == [123, 4]
+    assert parse(b'["ab"]', chunkSize=5) == ['ab']
+    assert parse(b'[12]', chunkSize=3) == [12]
+    # A number split before its fraction or exponent is not complete yet.
+    assert parse(b'[1.5,2e3]', chunkSize=2) == [1.5, 2e3]
+
+@pytest.mark.parametrize('chunkSize', [1, 2, 3, 4, 5])
+def test_multibyte_characters_split_across_chunks(chunkSize):
+    values = ['héllo wörld', '日本語', '👍 great']
+    assert parse(json.dumps(values, ensure_ascii=False).encode('utf-8'), chunkSize=chunkSize) == values
+
+@pytest.mark.parametrize('body', [b'[1] 2', b'[]x', b'["a"],', b'[1]]'])
+def test_trailing_garbage(body):
+    with pytest.raises(InvalidUsage) as error:
+        parse(body, chunkSize=2)
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize('body', [b'', b'{}', b'[1,', b'[1 2]', b'["open', b'[1,]'])
+def test_invalid_arrays(body):
+    with pytest.raises(InvalidUsage) as error:
+        parse(body, chunkSize=2)
+    assert error.value.status_code == 400
+
+def test_long_value_is_rejected_early():
+    stream = io.BytesIO(json.dumps(['x' * 1024 * 1024]).encode('utf-8'))
+    with pytest.raises(InvalidUsage) as error:
+        list(iterJSONArray(stream, chunkSize=1024, maxValueLength=4096))
+    assert error.value.status_code == 413
+    # Reading stops shortly after the limit instead of consuming the whole body.
+    assert stream.tell() <= 8 * 1024
+
+def test_long_value_within_limit():
+    assert parse(json.dumps(['x' * 5000, 'y']).encode('utf-8'), chunkSize=1024, maxValueLength=8192) == ['x' * 5000, 'y']
+
+# ==============================================================================
+# Documents
+# ==============================================================================
+
+def test_json_lines_skip_blank_lines():
+    assert list(iterJSONLines(io.BytesIO(b'"a"\n\n{"text": "b"}\n'))) == ['a', {'text': 'b'}]
+
+def test_documents():
+    body = json.dumps(['good', {'id': 'x', 'text': 'bad', 'language': 'dutch'}]).encode('utf-8')
+    documents = list(iterDocuments(io.BytesIO(body)))
+    assert [(document.id, document.text, document.language) for document in documents] == [(None, 'good', None), ('x', 'bad', 'dutch')]
+
+def test_document_limits():
+    with pytest.raises(InvalidUsage) as error:
+        list(iterDocuments(io.BytesIO(json.dumps(['a', 'b', 'c']).encode('utf-8')), maxDocuments=2))
+    assert error.value.status_code == 413
+
+    with pytest.raises(InvalidUsage) as error:
+        list(iterDocuments(io.BytesIO(json.dumps(['x' * 11]).encode('utf-8')), maxTextLength=10))
+    assert error.value.status_code == 413
+
+# ==============================================================================
+# Body limit
+# ==============================================================================
+
+def test_limited_body():
+    body = LimitedBody(io.BytesIO(b'"a"\n"b"\n'), 8)
+    assert list(iterJSONLines(body)) == ['a', 'b']
+
+    with pytest.raises(InvalidUsage) as error:
+        list(iterDocuments(LimitedBody(io.BytesIO(json.dumps(['x'] * 100).encode('utf-8')), 64)))
+    assert error.value.status_code == 413
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+from src.store import ReviewStore
+
+# ==============================================================================
+# Review store sync
+# ==============================================================================
+
+class FakeFeed():
+    """
+    Reviews numbered in the order they were written, served newest first in
+    pages of `pageSize`. Pages listed in `failing` fail, and every fetched
+    page is recorded in `fetched`.
+    """
+
+    def __init__(self, count, pageSize=50):
+        self.count = count
+        self.pageSize = pageSize
+        self.failing = set()
+        self.malformed = set()
+        self.fetched = []
+
+    def add(self, count):
+        self.count += count
+
+    def fetchPage(self, page):
+        self.fetched.append(page)
+        if page in self.failing:
+            return None
+
+        newest = self.count - (page - 1) * self.pageSize
+        entries = [entry(number) for number in range(newest, max(newest - self.pageSize, 0), -1)]
+        if page in self.malformed:
+            del entries[0]['id']
+        return entries
+
+def entry(number):
+    return {
+        'id': {'label': str(number)},
+        'author': {'name': {'label': 'author'}},
+        'title': {'label': 'Title'},
+        'content': {'label': 'Review'},
+        'im:rating': {'label': '5'},
+        'im:version': {'label': '1.0'},
+        'updated': {'label': f'2020-01-01T{number // 3600:02d}:{number // 60 % 60:02d}:{number % 60:02d}-07:00'},
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    return ReviewStore(str(tmp_path / 'reviews.db'), 'v1')
+
+def sync(store, feed, pages):
+    feed.fetched = []
+    return store.sync('us', 'app', feed.fetchPage, pages)
+
+def storedIDs(store):
+    return [int(record.id) for record in store.reviews('us', 'app')]
+
+def test_first_sync_is_bounded_by_pages(store):
+    feed = FakeFeed(500)
+    result = sync(store, feed, 2)
+
+    assert result.added == 100 and result.failedPages == []
+    assert feed.fetched == [1, 2]
+    assert storedIDs(store) == list(range(500, 400, -1))
+
+def test_growing_pages_deepens_the_history(store):
+    feed = FakeFeed(500)
+    sync(store, feed, 1)
+
+    assert sync(store, feed, 3).added == 100
+    assert feed.fetched == [1, 2, 3]
+    assert storedIDs(store) == list(range(500, 350, -1))
+
+    assert sync(store, feed, 10).added == 350
+    assert feed.fetched == [1] + list(range(4, 11))
+    assert storedIDs(store) == list(range(500, 0, -1))
+
+def test_poll_fetches_a_single_page(store):
+    feed = FakeFeed(500)
+    sync(store, feed, 3)
+    feed.add(10)
+
+    assert sync(store, feed, 3).added == 10
+    assert feed.fetched == [1]
+    assert storedIDs(store) == list(range(510, 350, -1))
+
+def test_pages_are_capped_by_the_feed(store):
+    feed = FakeFeed(1000)
+    sync(store, feed, 20)
+    assert feed.fetched == list(range(1, 11))
+
+def test_end_of_feed_is_remembered(store):
+    feed = FakeFeed(120)
+    sync(store, feed, 10)
+    assert feed.fetched == [1, 2, 3, 4]
+    assert len(storedIDs(store)) == 120
+
+    sync(store, feed, 10)
+    assert feed.fetched == [1]
+
+def test_failure_keeps_the_pages_before_it(store):
+    feed = FakeFeed(500)
+    feed.failing = {2}
+    result = sync(store, feed, 3)
+
+    assert result.added == 50 and result.failedPages == [2]
+    assert feed.fetched == [1, 2]
+    assert storedIDs(store) == list(range(500, 450, -1))
+
+    feed.failing = set()
+    result = sync(store, feed, 3)
+    assert result.added == 100 and result.failedPages == []
+    assert feed.fetched == [1, 2, 3]
+    assert storedIDs(store) == list(range(500, 350, -1))
+
+def test_malformed_page_counts_as_failed(store):
+    feed = FakeFeed(500)
+    feed.malformed = {2}
+    result = sync(store, feed, 3)
+
+    assert result.failedPages == [2]
+    assert storedIDs(store) == list(range(500, 450, -1))
+
+def test_gap_after_a_failure_is_filled(store):
+    feed = FakeFeed(500)
+    sync(store, feed, 2)
+
+    # 120 new reviews span pages 1 to 3, page 2 fails and leaves a gap under page 1.
+    feed.add(120)
+    feed.failing = {2}
+    assert sync(store, feed, 2).failedPages == [2]
+    assert store.syncState('us', 'app') == ('500', False)
+
+    # Later syncs go on past the stored page 1, within the requested pages, until they reach the boundary.
+    feed.failing = set()
+    assert sync(store, feed, 2).added == 50
+    assert store.syncState('us', 'app') == ('500', False)
+
+    assert sync(store, feed, 3).added == 20
+    assert feed.fetched == [1, 2, 3]
+    assert store.syncState('us', 'app') == (None, False)
+    assert storedIDs(store) == list(range(620, 400, -1))
+
+def test_gap_left_by_many_new_reviews_is_filled(store):
+    feed = FakeFeed(500)
+    sync(store, feed, 1)
+
+    # More new reviews than the requested pages hold.
+    feed.add(200)
+    sync(store, feed, 2)
+    assert store.syncState('us', 'app') == ('500', False)
+
+    sync(store, feed, 10)
+    assert store.syncState('us', 'app') == (None, False)
+    assert storedIDs(store) == list(range(700, 200, -1))